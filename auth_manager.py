@@ -1,40 +1,65 @@
 import os
-import time
 import logging
+import functools
+import requests
 from datetime import datetime
+from urllib.parse import urljoin, urlparse, parse_qs
+from urllib3.util.retry import Retry
 from kiteconnect import KiteConnect
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from webdriver_manager.chrome import ChromeDriverManager
-from dotenv import load_dotenv, set_key
+from config import load_env, update_env
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# Kite web login endpoints used by the HTTP login flow
+KITE_LOGIN_API_URL = "https://kite.zerodha.com/api/login"
+KITE_TWOFA_API_URL = "https://kite.zerodha.com/api/twofa"
+MAX_LOGIN_REDIRECTS = 10
+KITE_LOGIN_TIMEOUT_SECONDS = 10
+
+# Connection pool for the Kite API. Passing a pool makes KiteConnect create a
+# persistent requests.Session; without one every call opens a new connection.
+# Sized to match the order thread pool so concurrent calls reuse keep-alive
+# connections. Retry only covers idempotent methods by default, so order
+# POSTs are never replayed.
+KITE_CONNECTION_POOL = {
+    "pool_connections": 10,
+    "pool_maxsize": 10,
+    "max_retries": Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+}
+
+@functools.lru_cache(maxsize=None)
+def _get_chromedriver_path():
+    """Resolve the ChromeDriver binary once per process.
+    
+    Returns:
+        str: Path to the installed ChromeDriver
+    """
+    from webdriver_manager.chrome import ChromeDriverManager
+    return ChromeDriverManager().install()
+
 class ZerodhaAuthManager:
     """Manages authentication with Zerodha Kite API."""
     
-    def __init__(self, env_file_path):
+    def __init__(self, env_file_path, config=None):
         """Initialize authentication manager.
         
         Args:
             env_file_path: Path to the .env file containing credentials
+            config: Settings already loaded from env_file_path (optional)
         """
         self.env_file_path = env_file_path
-        load_dotenv(env_file_path)
+        self.config = config if config is not None else load_env(env_file_path)
         
-        self.api_key = os.getenv('API_KEY')
-        self.api_secret = os.getenv('API_SECRET')
-        self.access_token = os.getenv('ACCESS_TOKEN')
+        self.api_key = self.config.get('API_KEY')
+        self.api_secret = self.config.get('API_SECRET')
+        self.access_token = self.config.get('ACCESS_TOKEN')
         
         if not self.api_key or not self.api_secret:
             logger.error("API key or secret not found in environment variables.")
             raise ValueError("API key or secret not found in environment variables.")
         
-        self.kite = KiteConnect(api_key=self.api_key)
+        self.kite = KiteConnect(api_key=self.api_key, pool=KITE_CONNECTION_POOL)
     
     def is_token_valid(self):
         """Check if the current access token is valid."""
@@ -61,7 +86,7 @@ class ZerodhaAuthManager:
             str: Generated access token
         """
         if not request_token:
-            request_token = os.getenv('REQUEST_TOKEN')
+            request_token = self.config.get('REQUEST_TOKEN')
             
         if not request_token:
             logger.error("Request token not provided or not found in environment variables.")
@@ -82,26 +107,131 @@ class ZerodhaAuthManager:
             logger.error(f"Failed to generate access token: {str(e)}")
             raise
     
-    def automated_login(self, username, password, pin):
-        """Automated login using Selenium to obtain request token.
+    def automated_login(self, username, password, pin, use_selenium=False):
+        """Automated login to obtain request token.
         
         Args:
             username: Zerodha user ID
             password: Zerodha password
             pin: Zerodha PIN
+            use_selenium: Drive a headless Chrome instead of plain HTTP requests
         
         Returns:
             str: Generated access token
         """
         try:
             logger.info("Starting automated login process")
-            service = Service(ChromeDriverManager().install())
-            options = webdriver.ChromeOptions()
-            options.add_argument("--headless")  # Run in headless mode (no GUI)
-            options.add_argument("--disable-gpu")
-            options.add_argument("--no-sandbox")
+            if use_selenium:
+                request_token = self._get_request_token_selenium(username, password, pin)
+            else:
+                request_token = self._get_request_token_http(username, password, pin)
+            
+            # Save request token to env file
+            self._update_env_variable('REQUEST_TOKEN', request_token)
+            
+            # Generate access token from request token
+            return self.generate_access_token_from_request_token(request_token)
+        except Exception as e:
+            logger.error(f"Automated login failed: {str(e)}")
+            raise
+    
+    def _get_request_token_http(self, username, password, pin):
+        """Obtain request token by submitting the Kite login forms over HTTP.
+        
+        Args:
+            username: Zerodha user ID
+            password: Zerodha password
+            pin: Zerodha PIN
+        
+        Returns:
+            str: Request token
+        """
+        login_url = self.kite.login_url()
+        
+        with requests.Session() as session:
+            # Pick up the initial session cookies
+            session.get(login_url, timeout=KITE_LOGIN_TIMEOUT_SECONDS).raise_for_status()
+            
+            # Login Page
+            response = session.post(KITE_LOGIN_API_URL, data={
+                "user_id": username,
+                "password": password,
+            }, timeout=KITE_LOGIN_TIMEOUT_SECONDS)
+            data = self._parse_login_response(response).get("data") or {}
+            request_id = data.get("request_id")
+            if not request_id:
+                raise ValueError("Kite login response did not include a request_id.")
+            
+            # PIN Page
+            response = session.post(KITE_TWOFA_API_URL, data={
+                "user_id": username,
+                "request_id": request_id,
+                "twofa_value": pin,
+            }, timeout=KITE_LOGIN_TIMEOUT_SECONDS)
+            self._parse_login_response(response)
             
-            driver = webdriver.Chrome(service=service, options=options)
+            # Follow redirects by hand until one carries the request_token
+            url = login_url
+            for _ in range(MAX_LOGIN_REDIRECTS):
+                response = session.get(url, allow_redirects=False, timeout=KITE_LOGIN_TIMEOUT_SECONDS)
+                location = response.headers.get("Location")
+                if not location:
+                    break
+                
+                query = parse_qs(urlparse(location).query)
+                if "request_token" in query:
+                    return query["request_token"][0]
+                url = urljoin(url, location)
+        
+        raise ValueError("Request token not found in login redirect.")
+    
+    @staticmethod
+    def _parse_login_response(response):
+        """Decode a Kite login API response, raising on failure.
+        
+        Args:
+            response: Response from the login or twofa endpoint
+        
+        Returns:
+            dict: Decoded JSON payload
+        """
+        try:
+            payload = response.json()
+        except ValueError:
+            payload = {}
+        
+        if not response.ok:
+            # Surface Kite's own message (e.g. invalid credentials) over the HTTP status
+            message = payload.get("message") or f"HTTP {response.status_code}"
+            raise ValueError(f"Kite login request failed: {message}")
+        
+        return payload
+    
+    def _get_request_token_selenium(self, username, password, pin):
+        """Obtain request token by driving the Kite login page with Selenium.
+        
+        Args:
+            username: Zerodha user ID
+            password: Zerodha password
+            pin: Zerodha PIN
+        
+        Returns:
+            str: Request token
+        """
+        from selenium import webdriver
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.chrome.service import Service
+        from selenium.webdriver.support.ui import WebDriverWait
+        from selenium.webdriver.support import expected_conditions as EC
+        
+        service = Service(_get_chromedriver_path())
+        options = webdriver.ChromeOptions()
+        options.add_argument("--headless")  # Run in headless mode (no GUI)
+        options.add_argument("--disable-gpu")
+        options.add_argument("--no-sandbox")
+        
+        driver = webdriver.Chrome(service=service, options=options)
+        try:
             driver.get(self.kite.login_url())
             
             # Login Page
@@ -116,22 +246,13 @@ class ZerodhaAuthManager:
             driver.find_element(By.XPATH, "//button[@type='submit']").click()
             
             # Wait for redirection to dashboard which contains request_token
-            time.sleep(3)
+            WebDriverWait(driver, 15).until(lambda d: 'request_token=' in d.current_url)
             
             # Get the current URL which contains the request_token
             current_url = driver.current_url
-            request_token = current_url.split('request_token=')[1].split('&')[0]
-            
+            return current_url.split('request_token=')[1].split('&')[0]
+        finally:
             driver.quit()
-            
-            # Save request token to env file
-            self._update_env_variable('REQUEST_TOKEN', request_token)
-            
-            # Generate access token from request token
-            return self.generate_access_token_from_request_token(request_token)
-        except Exception as e:
-            logger.error(f"Automated login failed: {str(e)}")
-            raise
     
     def _update_env_variable(self, key, value):
         """Update environment variable in .env file.
@@ -141,22 +262,5 @@ class ZerodhaAuthManager:
             value: Variable value
         """
         os.environ[key] = value
-        
-        # Read all lines from env file
-        with open(self.env_file_path, 'r') as file:
-            lines = file.readlines()
-        
-        # Update or add the key-value pair
-        found = False
-        for i, line in enumerate(lines):
-            if line.startswith(f"{key}="):
-                lines[i] = f"{key}={value}\n"
-                found = True
-                break
-        
-        if not found:
-            lines.append(f"{key}={value}\n")
-        
-        # Write back to the file
-        with open(self.env_file_path, 'w') as file:
-            file.writelines(lines)
\ No newline at end of file
+        self.config[key] = value
+        update_env(self.env_file_path, key, value)
\ No newline at end of file
@@ -0,0 +1,88 @@
+import os
+import tempfile
+import functools
+from dotenv import dotenv_values
+from dotenv.parser import parse_stream
+
+# Settings documented in .env.template. These may also be supplied through
+# the process environment without being present in the .env file.
+ENV_KEYS = (
+    'API_KEY', 'API_SECRET', 'ACCESS_TOKEN', 'REQUEST_TOKEN',
+    'ENABLE_EMAIL_NOTIFICATIONS', 'EMAIL_SENDER', 'EMAIL_PASSWORD', 'EMAIL_RECIPIENTS',
+    'ENABLE_TELEGRAM_NOTIFICATIONS', 'TELEGRAM_BOT_TOKEN', 'TELEGRAM_CHAT_ID',
+    'RETRY_ATTEMPTS', 'RETRY_DELAY_SECONDS',
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _read_env(env_file_path):
+    """Parse a .env file, caching the result for the process.
+    
+    Args:
+        env_file_path: Path to the .env file
+    
+    Returns:
+        dict: Cached configuration values keyed by variable name
+    """
+    # Keys written without a value parse as None; load_dotenv skips them too
+    values = {key: value for key, value in dotenv_values(env_file_path).items() if value is not None}
+    
+    # Values already present in the process environment take precedence,
+    # matching the behaviour of load_dotenv followed by os.getenv
+    for key in set(values) | set(ENV_KEYS):
+        if key in os.environ:
+            values[key] = os.environ[key]
+    return values
+
+
+def load_env(env_file_path):
+    """Load settings from a .env file, parsing it once per process.
+    
+    Args:
+        env_file_path: Path to the .env file
+    
+    Returns:
+        dict: Copy of the configuration values keyed by variable name
+    """
+    return dict(_read_env(env_file_path))
+
+
+def update_env(env_file_path, key, value):
+    """Write a setting to a .env file and to the cached parse of it.
+    
+    The file is rewritten through a temp file in the same directory and
+    swapped in with os.replace, so a crash never leaves it half-written.
+    dotenv.set_key is not used because it stages its temp file in the
+    system temp dir, which is not an atomic rename across filesystems.
+    
+    Args:
+        env_file_path: Path to the .env file
+        key: Variable name
+        value: Variable value
+    """
+    env_dir = os.path.dirname(os.path.abspath(env_file_path))
+    with tempfile.NamedTemporaryFile(mode='w', dir=env_dir, delete=False) as tmp:
+        try:
+            found = False
+            missing_newline = False
+            with open(env_file_path, 'r') as file:
+                # Let dotenv's parser match keys so quoting and "export" are handled
+                for mapping in parse_stream(file):
+                    line = mapping.original.string
+                    if mapping.key == key and not found:
+                        line = f"{key}={value}\n"
+                        found = True
+                    tmp.write(line)
+                    missing_newline = not line.endswith("\n")
+            
+            if not found:
+                if missing_newline:
+                    tmp.write("\n")
+                tmp.write(f"{key}={value}\n")
+        except Exception:
+            tmp.close()
+            os.remove(tmp.name)
+            raise
+    
+    os.replace(tmp.name, env_file_path)
+    _read_env(env_file_path)[key] = value
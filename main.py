@@ -1,18 +1,30 @@
 import os
 import time
 import logging
-import schedule
 import datetime
-import pytz
 import argparse
+from concurrent.futures import ThreadPoolExecutor, wait
 from pathlib import Path
-from dotenv import load_dotenv
+from zoneinfo import ZoneInfo
 
 # Import custom modules
+from config import load_env
 from auth_manager import ZerodhaAuthManager
 from order_manager import ZerodhaOrderManager
 from notification_manager import NotificationManager
 
+# Indian Standard Time, used for market days and order timestamps
+IST = ZoneInfo('Asia/Kolkata')
+
+# Maximum number of orders placed concurrently
+MAX_ORDER_WORKERS = 10
+
+# Longest single sleep between scheduler checks
+SCHEDULER_MAX_SLEEP_SECONDS = 60
+
+# Seconds to wait for per-order notifications before sending the summary
+NOTIFICATION_WAIT_TIMEOUT = 30
+
 # Configure logging
 def setup_logging(log_dir):
     """Set up logging configuration.
@@ -69,11 +81,13 @@ class TradeMaster:
                 raise FileNotFoundError("Environment template file not found")
         
         # Load environment variables
-        load_dotenv(self.env_file)
+        self.config = load_env(self.env_file)
+        self.retry_attempts = int(self.config.get('RETRY_ATTEMPTS', 3))
+        self.retry_delay = int(self.config.get('RETRY_DELAY_SECONDS', 2))
         
         # Initialize components
-        self.auth_manager = ZerodhaAuthManager(self.env_file)
-        self.notification_manager = NotificationManager(self.env_file)
+        self.auth_manager = ZerodhaAuthManager(self.env_file, config=self.config)
+        self.notification_manager = NotificationManager(config=self.config)
         
         # Set up Kite client
         try:
@@ -90,7 +104,7 @@ class TradeMaster:
             self.logger.info("Using existing valid access token")
         else:
             self.logger.warning("No valid access token found, regeneration required")
-            request_token = os.getenv('REQUEST_TOKEN')
+            request_token = self.config.get('REQUEST_TOKEN')
             
             if request_token:
                 self.logger.info("Generating access token from saved request token")
@@ -109,8 +123,7 @@ class TradeMaster:
         self.logger.info("Starting scheduled order placement")
         
         # Check if market is open
-        ist_timezone = pytz.timezone('Asia/Kolkata')
-        current_time = datetime.datetime.now(ist_timezone)
+        current_time = datetime.datetime.now(IST)
         is_weekday = current_time.weekday() < 5  # Monday to Friday
         
         if not is_weekday:
@@ -120,7 +133,7 @@ class TradeMaster:
         # Load stock configuration
         stock_config_file = os.path.join(self.config_dir, 'stocks.csv')
         try:
-            stock_config = self.order_manager.load_stock_config(stock_config_file)
+            stocks = self.order_manager.load_stock_config(stock_config_file)
         except Exception as e:
             error_msg = f"Failed to load stock configuration: {str(e)}"
             self.logger.error(error_msg)
@@ -131,32 +144,41 @@ class TradeMaster:
             )
             return
         
+        # Check margin requirements for all stocks in a single request
+        try:
+            margins_required = self.order_manager.precheck_margins(stocks)
+        except Exception as e:
+            self.logger.warning(f"Failed to precheck margins, checking per order: {str(e)}")
+            margins_required = [None] * len(stocks)
+        
         # Place orders for each active stock
         all_results = []
-        for index, stock in stock_config.iterrows():
-            self.logger.info(f"Processing order for {stock['trading_symbol']}")
-            
-            # Place the order
-            result = self.order_manager.place_order(
-                stock,
-                retry_attempts=int(os.getenv('RETRY_ATTEMPTS', 3)),
-                retry_delay=int(os.getenv('RETRY_DELAY_SECONDS', 2))
-            )
-            
-            # Add timestamp to result
-            result['timestamp'] = datetime.datetime.now(ist_timezone).strftime('%Y-%m-%d %H:%M:%S')
-            all_results.append(result)
-            
-            # Send notifications based on order result
-            if result['success']:
-                self.notification_manager.notify_order_placed(result)
-            else:
-                self.notification_manager.notify_order_failed(result, result['error'])
+        successful_orders = 0
+        notification_futures = []
+        try:
+            max_workers = max(1, min(MAX_ORDER_WORKERS, len(stocks)))
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = executor.map(self._place_stock_order, stocks, margins_required)
+                for result in results:
+                    all_results.append(result)
+                    successful_orders += result['success']
+                    
+                    # Send notifications based on order result
+                    if result['success']:
+                        future = self.notification_manager.notify_order_placed(result)
+                    else:
+                        future = self.notification_manager.notify_order_failed(result, result['error'])
+                    notification_futures.append(future)
+        finally:
+            # Later orders outside this batch should check live margins
+            self.order_manager.finish_batch()
+        
+        # Let per-order notifications go out before the summary
+        wait(notification_futures, timeout=NOTIFICATION_WAIT_TIMEOUT)
         
         self.logger.info(f"Completed scheduled order placement for {len(all_results)} stocks")
         
         # Summary notification
-        successful_orders = sum(1 for r in all_results if r['success'])
         failed_orders = len(all_results) - successful_orders
         
         self.notification_manager.send_notification(
@@ -167,10 +189,37 @@ class TradeMaster:
             "INFO"
         )
         
+    def _place_stock_order(self, stock, margin_required):
+        """Place the order for a single stock entry.
+        
+        Args:
+            stock: Dict containing stock configuration
+            margin_required: Margin required from precheck_margins, or None
+        
+        Returns:
+            dict: Order result with timestamp
+        """
+        self.logger.info(f"Processing order for {stock['trading_symbol']}")
+        
+        # Place the order
+        result = self.order_manager.place_order(
+            stock,
+            retry_attempts=self.retry_attempts,
+            retry_delay=self.retry_delay,
+            precomputed_margin=margin_required
+        )
+        
+        # Add timestamp to result
+        result['timestamp'] = datetime.datetime.now(IST).strftime('%Y-%m-%d %H:%M:%S')
+        return result
+    
     def start_scheduler(self):
         """Start the scheduler to place orders at specified time."""
         self.logger.info("Starting order scheduler")
         
+        # Imported lazily since --run-now never needs the scheduler
+        import schedule
+        
         # Schedule order placement at 9:30 AM IST
         schedule.every().day.at("09:30").do(self.place_scheduled_orders)
         
@@ -181,10 +230,14 @@ class TradeMaster:
             "INFO"
         )
         
-        # Keep the scheduler running
+        # Keep the scheduler running, sleeping until the next job is due. Sleeps
+        # are capped so a host suspend cannot delay the run by hours.
         while True:
             schedule.run_pending()
-            time.sleep(1)
+            idle_seconds = schedule.idle_seconds()
+            if idle_seconds is None:
+                break
+            time.sleep(min(max(1, idle_seconds), SCHEDULER_MAX_SLEEP_SECONDS))
 
 def main():
     """Main entry point for the application."""
@@ -1,37 +1,58 @@
-import os
+import atexit
 import logging
 import smtplib
-import telegram
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from dotenv import load_dotenv
+from config import load_env
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# SMTP server settings
+SMTP_HOST = 'smtp.gmail.com'
+SMTP_PORT = 587
+SMTP_IDLE_TIMEOUT_SECONDS = 300
+
 class NotificationManager:
     """Manages notifications through email and Telegram."""
     
-    def __init__(self, env_file_path):
+    def __init__(self, env_file_path=None, config=None):
         """Initialize notification manager.
         
         Args:
             env_file_path: Path to the .env file containing notification settings
+            config: Settings already loaded from the .env file, used instead of env_file_path
         """
-        load_dotenv(env_file_path)
+        if config is None:
+            if env_file_path is None:
+                raise ValueError("Either env_file_path or config must be provided.")
+            config = load_env(env_file_path)
         
         # Email settings
-        self.enable_email = os.getenv('ENABLE_EMAIL_NOTIFICATIONS', 'False').lower() == 'true'
-        self.email_sender = os.getenv('EMAIL_SENDER')
-        self.email_password = os.getenv('EMAIL_PASSWORD')
-        self.email_recipients = os.getenv('EMAIL_RECIPIENTS', '').split(',')
+        self.enable_email = config.get('ENABLE_EMAIL_NOTIFICATIONS', 'False').lower() == 'true'
+        self.email_sender = config.get('EMAIL_SENDER')
+        self.email_password = config.get('EMAIL_PASSWORD')
+        self.email_recipients = config.get('EMAIL_RECIPIENTS', '').split(',')
         
         # Telegram settings
-        self.enable_telegram = os.getenv('ENABLE_TELEGRAM_NOTIFICATIONS', 'False').lower() == 'true'
-        self.telegram_bot_token = os.getenv('TELEGRAM_BOT_TOKEN')
-        self.telegram_chat_id = os.getenv('TELEGRAM_CHAT_ID')
+        self.enable_telegram = config.get('ENABLE_TELEGRAM_NOTIFICATIONS', 'False').lower() == 'true'
+        self.telegram_bot_token = config.get('TELEGRAM_BOT_TOKEN')
+        self.telegram_chat_id = config.get('TELEGRAM_CHAT_ID')
         
         self._setup_clients()
+        
+        # Persistent SMTP connection, closed after SMTP_IDLE_TIMEOUT_SECONDS idle
+        self._smtp = None
+        self._smtp_lock = threading.Lock()
+        self._smtp_idle_timer = None
+        atexit.register(self._close_smtp)
+        
+        # Deliver notifications off the caller's thread. A single worker keeps
+        # them in the order they were sent; pending ones are flushed on exit.
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="notification")
+        atexit.register(self._pool.shutdown, wait=True)
     
     def _setup_clients(self):
         """Set up notification clients."""
@@ -42,6 +63,8 @@ class NotificationManager:
                     logger.warning("Telegram notifications enabled but missing credentials.")
                     self.enable_telegram = False
                 else:
+                    # Imported lazily so runs without Telegram skip its import cost
+                    import telegram
                     self.telegram_bot = telegram.Bot(token=self.telegram_bot_token)
                     logger.info("Telegram client initialized successfully.")
             except Exception as e:
@@ -59,6 +82,25 @@ class NotificationManager:
     def send_notification(self, subject, message, notification_type="INFO"):
         """Send notification through configured channels.
         
+        Delivery happens in the background; this returns immediately.
+        
+        Args:
+            subject: Notification subject
+            message: Notification message
+            notification_type: Type of notification (INFO, SUCCESS, ERROR)
+        
+        Returns:
+            Future: Completes once the notification has been delivered
+        """
+        # Always log the notification
+        log_level = logging.ERROR if notification_type == "ERROR" else logging.INFO
+        logger.log(log_level, f"Notification: {subject} - {message}")
+        
+        return self._pool.submit(self._dispatch, subject, message, notification_type)
+    
+    def _dispatch(self, subject, message, notification_type):
+        """Deliver a notification to every enabled channel.
+        
         Args:
             subject: Notification subject
             message: Notification message
@@ -71,10 +113,6 @@ class NotificationManager:
         
         if self.enable_telegram:
             self._send_telegram(formatted_message)
-        
-        # Always log the notification
-        log_level = logging.ERROR if notification_type == "ERROR" else logging.INFO
-        logger.log(log_level, f"Notification: {subject} - {message}")
     
     def _send_email(self, subject, body):
         """Send email notification.
@@ -91,15 +129,71 @@ class NotificationManager:
             
             msg.attach(MIMEText(body, 'plain'))
             
-            server = smtplib.SMTP('smtp.gmail.com', 587)
-            server.starttls()
-            server.login(self.email_sender, self.email_password)
-            server.send_message(msg)
-            server.quit()
+            with self._smtp_lock:
+                server = self._get_smtp_connection()
+                server.send_message(msg)
+                self._schedule_smtp_idle_close()
             
             logger.info(f"Email notification sent: {subject}")
         except Exception as e:
             logger.error(f"Failed to send email notification: {str(e)}")
+            # Drop the connection so the next email starts from a fresh one
+            self._close_smtp()
+    
+    def _get_smtp_connection(self):
+        """Return a live SMTP connection, reconnecting if needed.
+        
+        Must be called with the SMTP lock held.
+        
+        Returns:
+            smtplib.SMTP: Authenticated SMTP connection
+        """
+        if self._smtp is not None:
+            try:
+                if self._smtp.noop()[0] == 250:
+                    return self._smtp
+            except (smtplib.SMTPException, OSError):
+                pass
+            logger.info("SMTP connection lost, reconnecting.")
+            self._smtp = None
+        
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT)
+        try:
+            server.starttls()
+            server.login(self.email_sender, self.email_password)
+        except Exception:
+            server.close()
+            raise
+        self._smtp = server
+        return server
+    
+    def _schedule_smtp_idle_close(self):
+        """Restart the timer that closes the SMTP connection when idle.
+        
+        Must be called with the SMTP lock held.
+        """
+        if self._smtp_idle_timer is not None:
+            self._smtp_idle_timer.cancel()
+        
+        self._smtp_idle_timer = threading.Timer(SMTP_IDLE_TIMEOUT_SECONDS, self._close_smtp)
+        self._smtp_idle_timer.daemon = True
+        self._smtp_idle_timer.start()
+    
+    def _close_smtp(self):
+        """Close the persistent SMTP connection if one is open."""
+        with self._smtp_lock:
+            if self._smtp_idle_timer is not None:
+                self._smtp_idle_timer.cancel()
+                self._smtp_idle_timer = None
+            
+            if self._smtp is None:
+                return
+            
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._smtp = None
     
     def _send_telegram(self, message):
         """Send Telegram notification.
@@ -118,12 +212,15 @@ class NotificationManager:
         
         Args:
             order_details: Dictionary containing order details
+        
+        Returns:
+            Future: Completes once the notification has been delivered
         """
         subject = f"Order Placed: {order_details.get('symbol')}"
         message = f"Order ID: {order_details.get('order_id')}\n"\
                  f"Symbol: {order_details.get('symbol')}\n"\
                  f"Timestamp: {order_details.get('timestamp', 'Not available')}"
-        self.send_notification(subject, message, "SUCCESS")
+        return self.send_notification(subject, message, "SUCCESS")
     
     def notify_order_failed(self, order_details, error_message):
         """Send notification for failed order placement.
@@ -131,20 +228,26 @@ class NotificationManager:
         Args:
             order_details: Dictionary containing order details
             error_message: Error message
+        
+        Returns:
+            Future: Completes once the notification has been delivered
         """
         subject = f"Order Failed: {order_details.get('symbol')}"
         message = f"Symbol: {order_details.get('symbol')}\n"\
                  f"Error: {error_message}\n"\
                  f"Timestamp: {order_details.get('timestamp', 'Not available')}"
-        self.send_notification(subject, message, "ERROR")
+        return self.send_notification(subject, message, "ERROR")
     
     def notify_authentication_failure(self, error_message):
         """Send notification for authentication failure.
         
         Args:
             error_message: Error message
+        
+        Returns:
+            Future: Completes once the notification has been delivered
         """
         subject = "Zerodha Authentication Failed"
         message = f"Error: {error_message}\n"\
                  f"Please check your credentials and regenerate access token."
-        self.send_notification(subject, message, "ERROR")
\ No newline at end of file
+        return self.send_notification(subject, message, "ERROR")
\ No newline at end of file
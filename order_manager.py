@@ -1,22 +1,54 @@
 import os
+import csv
+import time
 import logging
-import pandas as pd
+import threading
 from datetime import datetime
 from kiteconnect import KiteConnect
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
+# Upper bound on the exponential backoff between order retries
+MAX_RETRY_DELAY_SECONDS = 30
+
+class RateLimiter:
+    """Spaces out calls so that no more than a fixed number run per second."""
+    
+    def __init__(self, max_calls_per_second):
+        """Initialize rate limiter.
+        
+        Args:
+            max_calls_per_second: Maximum number of calls allowed per second
+        """
+        self.interval = 1.0 / max_calls_per_second
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+    
+    def wait(self):
+        """Block until the caller is allowed to make the next call."""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        
+        if slot > now:
+            time.sleep(slot - now)
+
 class ZerodhaOrderManager:
     """Manages stock order configuration and placement."""
     
-    def __init__(self, kite_client):
+    def __init__(self, kite_client, max_orders_per_second=10):
         """Initialize order manager.
         
         Args:
             kite_client: Authenticated KiteConnect client
+            max_orders_per_second: Kite order placement rate limit
         """
         self.kite = kite_client
+        self._available_margin = None
+        self._margin_lock = threading.Lock()
+        self._order_rate_limiter = RateLimiter(max_orders_per_second)
         
     def load_stock_config(self, config_file):
         """Load stock configuration from CSV file.
@@ -25,20 +57,32 @@ class ZerodhaOrderManager:
             config_file: Path to CSV file containing stock configuration
         
         Returns:
-            DataFrame: Stock configuration data
+            list: Dicts containing configuration for each active stock
         """
         try:
-            df = pd.read_csv(config_file)
+            with open(config_file, newline='') as file:
+                reader = csv.DictReader(file)
+                rows = list(reader)
+                columns = reader.fieldnames or []
+            
             required_columns = ['trading_symbol', 'quantity', 'order_type', 'limit_price', 'is_active']
             
             # Validate required columns
-            missing_columns = [col for col in required_columns if col not in df.columns]
+            missing_columns = [col for col in required_columns if col not in columns]
             if missing_columns:
                 logger.error(f"Missing required columns in stock config: {missing_columns}")
                 raise ValueError(f"Stock config is missing required columns: {missing_columns}")
             
             # Filter out inactive stocks
-            active_stocks = df[df['is_active']]
+            active_stocks = [
+                row for row in rows
+                if (row['is_active'] or '').strip().lower() in ('true', '1', 'yes')
+            ]
+            
+            # Parse the exchange prefix once so orders can use it directly
+            for stock in active_stocks:
+                stock['exchange'], stock['tradingsymbol'] = self._split_symbol(stock['trading_symbol'])
+            
             logger.info(f"Loaded {len(active_stocks)} active stocks from configuration")
             
             return active_stocks
@@ -46,66 +90,164 @@ class ZerodhaOrderManager:
             logger.error(f"Failed to load stock configuration: {str(e)}")
             raise
     
-    def place_order(self, stock_entry, retry_attempts=3, retry_delay=2):
+    def precheck_margins(self, stock_entries):
+        """Fetch margin requirements for a batch of stock entries in one call.
+        
+        Also caches the available margin for the batch so that individual
+        orders do not fetch user margins again. Call finish_batch once the
+        batch's orders have been placed.
+        
+        Args:
+            stock_entries: List of dicts containing stock configuration
+        
+        Returns:
+            list: Margin required for each entry, in the same order as
+                stock_entries. Entries whose margin could not be checked are
+                None so their orders fall back to checking it individually.
+        """
+        stock_entries = list(stock_entries)
+        margins_required = [None] * len(stock_entries)
+        if not stock_entries:
+            return margins_required
+        
+        self._available_margin = self._get_available_margin()
+        
+        # Leave out entries whose params cannot be built; place_order reports them
+        batch_indexes = []
+        all_params = []
+        for index, stock_entry in enumerate(stock_entries):
+            try:
+                all_params.append(self._build_order_params(stock_entry))
+                batch_indexes.append(index)
+            except Exception as e:
+                logger.warning(f"Skipping margin precheck for {stock_entry.get('trading_symbol')}: {str(e)}")
+        
+        if not all_params:
+            return margins_required
+        
+        try:
+            margins = self.kite.order_margins(all_params)
+            for index, margin in zip(batch_indexes, margins):
+                margins_required[index] = float(margin.get('total', 0))
+        except Exception as e:
+            # Orders fall back to checking their own margin individually
+            logger.warning(f"Failed to check batch margin requirements: {str(e)}")
+        
+        return margins_required
+    
+    def finish_batch(self):
+        """Drop the available margin cached by precheck_margins.
+        
+        Later orders outside a batch go back to checking live margins.
+        """
+        with self._margin_lock:
+            self._available_margin = None
+    
+    def place_order(self, stock_entry, retry_attempts=3, retry_delay=2, precomputed_margin=None):
         """Place an order for a stock entry.
         
         Args:
-            stock_entry: Series containing stock configuration
+            stock_entry: Dict containing stock configuration
             retry_attempts: Number of retry attempts if order fails
-            retry_delay: Delay in seconds between retry attempts
+            retry_delay: Initial delay in seconds between retry attempts, doubled after each retry
+            precomputed_margin: Margin required from precheck_margins (optional)
             
         Returns:
             dict: Order response
         """
         symbol = stock_entry['trading_symbol']
-        quantity = int(stock_entry['quantity'])
-        order_type = stock_entry['order_type']
-        limit_price = float(stock_entry['limit_price']) if order_type == 'LIMIT' else None
         
-        logger.info(f"Placing order for {symbol}: {quantity} shares at {order_type}" + 
-                   (f" price {limit_price}" if limit_price else ""))
-        
-        # ESM stocks can only be traded with CNC product type
+        # Build params and validate margin once; retries only re-send the order.
+        # Raw CSV values are converted here so a bad row becomes a failure result.
         try:
-            order_params = {
-                "tradingsymbol": symbol.split(':')[-1],  # Remove exchange prefix if present
-                "exchange": symbol.split(':')[0] if ':' in symbol else "NSE",
-                "transaction_type": "BUY",
-                "quantity": quantity,
-                "product": "CNC",  # ESM stocks allow only CNC
-                "order_type": order_type,
-            }
+            order_params = self._build_order_params(stock_entry)
             
-            # Add price for LIMIT orders
-            if order_type == "LIMIT" and limit_price:
-                order_params["price"] = limit_price
-                
-            # Validate margin before placing order
-            margin_required = self._check_margin_required(order_params)
+            logger.info(f"Placing order for {symbol}: {order_params['quantity']} shares at {order_params['order_type']}" + 
+                       (f" price {order_params['price']}" if 'price' in order_params else ""))
+            
+            margin_required = precomputed_margin
+            if margin_required is None:
+                margin_required = self._check_margin_required(order_params)
             if not self._has_sufficient_margin(margin_required):
                 logger.error(f"Insufficient margin for {symbol}. Required: {margin_required}")
                 raise ValueError(f"Insufficient margin for {symbol}. Required: {margin_required}")
-                
-            # Place the order
-            order_id = self.kite.place_order(
-                variety="regular",
-                **order_params
-            )
-            
-            logger.info(f"Order placed successfully for {symbol}. Order ID: {order_id}")
-            return {"success": True, "order_id": order_id, "symbol": symbol}
-            
         except Exception as e:
             logger.error(f"Failed to place order for {symbol}: {str(e)}")
-            
-            # Retry logic for order placement
-            if retry_attempts > 0:
-                import time
-                logger.info(f"Retrying order for {symbol}. Attempts left: {retry_attempts}")
-                time.sleep(retry_delay)
-                return self.place_order(stock_entry, retry_attempts - 1, retry_delay)
-            
             return {"success": False, "error": str(e), "symbol": symbol}
+        
+        last_error = None
+        for attempt in range(retry_attempts + 1):
+            try:
+                # Place the order
+                self._order_rate_limiter.wait()
+                order_id = self.kite.place_order(
+                    variety="regular",
+                    **order_params
+                )
+                
+                logger.info(f"Order placed successfully for {symbol}. Order ID: {order_id}")
+                return {"success": True, "order_id": order_id, "symbol": symbol}
+                
+            except Exception as e:
+                last_error = e
+                logger.error(f"Failed to place order for {symbol}: {str(e)}")
+                
+                # Retry with exponential backoff
+                if attempt < retry_attempts:
+                    delay = min(retry_delay * (2 ** attempt), MAX_RETRY_DELAY_SECONDS)
+                    logger.info(f"Retrying order for {symbol} in {delay}s. Attempts left: {retry_attempts - attempt}")
+                    time.sleep(delay)
+        
+        # Give back margin held for an order that was not placed
+        self._release_margin(margin_required)
+        return {"success": False, "error": str(last_error), "symbol": symbol}
+    
+    def _build_order_params(self, stock_entry):
+        """Build Kite order parameters for a stock entry.
+        
+        Args:
+            stock_entry: Dict containing stock configuration
+        
+        Returns:
+            dict: Order parameters
+        """
+        order_type = stock_entry['order_type']
+        limit_price = float(stock_entry['limit_price']) if order_type == 'LIMIT' else None
+        
+        if 'tradingsymbol' in stock_entry:
+            exchange, tradingsymbol = stock_entry['exchange'], stock_entry['tradingsymbol']
+        else:
+            exchange, tradingsymbol = self._split_symbol(stock_entry['trading_symbol'])
+        
+        # ESM stocks can only be traded with CNC product type
+        order_params = {
+            "tradingsymbol": tradingsymbol,
+            "exchange": exchange,
+            "transaction_type": "BUY",
+            "quantity": int(stock_entry['quantity']),
+            "product": "CNC",  # ESM stocks allow only CNC
+            "order_type": order_type,
+        }
+        
+        # Add price for LIMIT orders
+        if order_type == "LIMIT" and limit_price:
+            order_params["price"] = limit_price
+        
+        return order_params
+    
+    @staticmethod
+    def _split_symbol(symbol):
+        """Split a trading symbol into exchange and symbol.
+        
+        Args:
+            symbol: Trading symbol, optionally prefixed with exchange (e.g. NSE:SBIN)
+        
+        Returns:
+            tuple: Exchange (defaults to NSE) and symbol without prefix
+        """
+        parts = symbol.split(':', 1)
+        exchange = parts[0] if len(parts) == 2 else "NSE"
+        return exchange, parts[-1]
     
     def _check_margin_required(self, order_params):
         """Check margin required for an order.
@@ -137,23 +279,54 @@ class ZerodhaOrderManager:
                 logger.error(f"Could not estimate margin for {symbol}. Using fallback.")
                 return float('inf')
     
+    def _get_available_margin(self):
+        """Fetch available cash margin for the user.
+        
+        Returns:
+            float: Available margin, or None if it could not be fetched
+        """
+        try:
+            margins = self.kite.margins()
+            return float(margins.get('equity', {}).get('available', {}).get('cash', 0))
+        except Exception as e:
+            logger.warning(f"Failed to check user margins: {str(e)}")
+            return None
+    
     def _has_sufficient_margin(self, margin_required):
         """Check if user has sufficient margin for the order.
         
+        When a batch has been prechecked, the required margin is reserved
+        from the cached available margin so concurrent orders cannot
+        overspend it.
+        
         Args:
             margin_required: Margin required for the order
             
         Returns:
             bool: True if user has sufficient margin
         """
-        try:
-            # Get user margins
-            margins = self.kite.margins()
-            available_margin = float(margins.get('equity', {}).get('available', {}).get('cash', 0))
-            
-            logger.info(f"Margin check: Required {margin_required}, Available {available_margin}")
-            return available_margin >= margin_required
-        except Exception as e:
-            logger.warning(f"Failed to check user margins: {str(e)}")
+        with self._margin_lock:
+            if self._available_margin is not None:
+                logger.info(f"Margin check: Required {margin_required}, Available {self._available_margin}")
+                if self._available_margin < margin_required:
+                    return False
+                self._available_margin -= margin_required
+                return True
+        
+        available_margin = self._get_available_margin()
+        if available_margin is None:
             # If margin check fails, assume sufficient margin to avoid blocking orders
-            return True
\ No newline at end of file
+            return True
+        
+        logger.info(f"Margin check: Required {margin_required}, Available {available_margin}")
+        return available_margin >= margin_required
+    
+    def _release_margin(self, margin_required):
+        """Return reserved margin to the cached available margin.
+        
+        Args:
+            margin_required: Margin previously reserved for the order
+        """
+        with self._margin_lock:
+            if self._available_margin is not None:
+                self._available_margin += margin_required
\ No newline at end of file